@@ -3,16 +3,117 @@
 """
 Модуль для сравнительной оценки Whisper и Faster-Whisper
 Включает замеры времени, памяти и метрики точности (WER, CER)
+
+Время считается в двух вариантах:
+  - steady_state_time - только транскрипция (модель уже загружена), по нему выбирается победитель
+  - cold_start_time - загрузка модели + транскрипция (первый запуск)
 """
 
-import time
+import sys
+import threading
 import psutil
 import os
-from typing import Callable, Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Union
 from dataclasses import dataclass
 import jiwer  # pip install jiwer
+import numpy as np
+from faster_whisper import decode_audio
+from faster_whisper_transcribe import PHYSICAL_CORES
 from pathlib import Path
 
+try:
+    # C++ реализация расстояния Левенштейна (pip install rapidfuzz)
+    from rapidfuzz.distance import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Нормализация текста перед WER/CER: регистр, пунктуация, пробелы
+_normalize_text = jiwer.Compose([
+    jiwer.ToLowerCase(),
+    jiwer.RemovePunctuation(),
+    jiwer.RemoveMultipleSpaces(),
+    jiwer.Strip(),
+])
+
+
+def _max_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса за все время работы (ru_maxrss), MB"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    if sys.platform == "darwin":
+        return max_rss / 1024 / 1024
+    return max_rss / 1024
+
+
+def _clear_model_cache(transcribe_func: Callable):
+    """Выгрузка моделей, закэшированных модулем функции транскрипции (clear_model_cache)"""
+    module = sys.modules.get(transcribe_func.__module__)
+    clear_model_cache = getattr(module, "clear_model_cache", None)
+    if clear_model_cache is not None:
+        clear_model_cache()
+
+
+def _load_audio(path: str) -> np.ndarray:
+    """Декодирование аудиофайла в mono float32 с частотой 16 кГц"""
+    return decode_audio(path, sampling_rate=16000)
+
+
+class _ResourceSampler:
+    """Фоновый сбор загрузки CPU и RSS процесса во время транскрипции"""
+    
+    def __init__(self, process: psutil.Process, interval: float = 0.1):
+        self.process = process
+        self.interval = interval
+        self.cpu_samples: List[float] = []
+        self.rss_samples: List[float] = []
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        # cpu_percent(interval=...) блокирует на interval и возвращает загрузку за это окно
+        while True:
+            self.cpu_samples.append(self.process.cpu_percent(interval=self.interval))
+            self.rss_samples.append(self.process.memory_info().rss / 1024 / 1024)  # MB
+            if self._stop_event.is_set():
+                break
+    
+    def __enter__(self):
+        self._max_rss_before = _max_rss_mb()
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop_event.set()
+        self._thread.join()
+        self._max_rss_after = _max_rss_mb()
+    
+    @property
+    def cpu_mean(self) -> float:
+        return sum(self.cpu_samples) / len(self.cpu_samples)
+    
+    @property
+    def cpu_peak(self) -> float:
+        return max(self.cpu_samples)
+    
+    @property
+    def rss_peak(self) -> float:
+        """
+        Пиковый RSS за время замера, MB. Если ru_maxrss вырос во время замера,
+        он точнее выборки (ловит кратковременные выбросы между замерами)
+        """
+        peak = max(self.rss_samples)
+        if self._max_rss_after is not None and self._max_rss_after > self._max_rss_before:
+            peak = max(peak, self._max_rss_after)
+        return peak
+
 
 @dataclass
 class BenchmarkResult:
@@ -21,30 +122,52 @@ class BenchmarkResult:
     load_time: float
     transcribe_time: float
     total_time: float
-    memory_used_mb: float
-    cpu_percent: float
+    steady_state_time: float  # только транскрипция
+    cold_start_time: float  # загрузка модели + транскрипция
+    memory_used_mb: float  # разница RSS до и после
+    cpu_percent: float  # средняя загрузка CPU процессом за время транскрипции
     transcription: str
     wer: Optional[float] = None  # Word Error Rate
     cer: Optional[float] = None  # Character Error Rate
+    compute_type: Optional[str] = None  # фактическая точность вычислений (int8, float16, ...)
+    cpu_percent_peak: Optional[float] = None  # пиковая загрузка CPU процессом
+    peak_rss_mb: Optional[float] = None  # пик RSS относительно начала замера (модель + транскрипция)
+    peak_rss_abs_mb: Optional[float] = None  # абсолютный пиковый RSS процесса
 
 
 class ASRBenchmark:
     """Класс для бенчмаркинга ASR систем"""
     
-    def __init__(self, audio_path: str, reference_text: Optional[str] = None):
+    # Длина прогревочного фрагмента: 5 секунд при 16 кГц
+    WARMUP_SAMPLES = 5 * 16000
+    
+    def __init__(self, audio_path: Union[str, List[str]], reference_text: Optional[str] = None):
         """
         Args:
-            audio_path: путь к аудиофайлу для тестирования
+            audio_path: путь к аудиофайлу или список путей для тестирования
+                (список передается в батчевые функции, например transcribe_batched)
             reference_text: эталонный текст для расчета WER/CER (опционально)
         """
         self.audio_path = audio_path
         self.reference_text = reference_text
+        # Эталон нормализуется один раз и переиспользуется для всех моделей
+        if reference_text:
+            self._reference_norm = _normalize_text(reference_text)
+            self._reference_tokens = tuple(self._reference_norm.split())
+            if not self._reference_tokens:
+                raise ValueError(
+                    "Эталонный текст пуст после нормализации (только пунктуация или пробелы)"
+                )
         self.results: List[BenchmarkResult] = []
+        self._audio: Optional[Union[np.ndarray, List[np.ndarray]]] = None
+        # Функция и параметры последнего замера: при смене модели кэш прошлой выгружается
+        self._last_model: Optional[tuple] = None
     
     def benchmark_function(
         self,
         transcribe_func: Callable,
         model_name: str,
+        warmup: bool = True,
         **kwargs
     ) -> BenchmarkResult:
         """
@@ -53,12 +176,27 @@ class ASRBenchmark:
         Args:
             transcribe_func: функция транскрипции
             model_name: название модели для отображения
+            warmup: выполнить короткую прогревочную транскрипцию перед замером
+                (модель загружается и кэшируется, выбираются ядра oneDNN/MKL)
             **kwargs: дополнительные параметры для функции
         
         Returns:
             BenchmarkResult с метриками
         """
         
+        # Декодируем аудио один раз, вне замеряемого участка
+        if self._audio is None:
+            if isinstance(self.audio_path, list):
+                self._audio = [_load_audio(path) for path in self.audio_path]
+            else:
+                self._audio = _load_audio(self.audio_path)
+        
+        # Смена бэкенда или модели: выгружаем предыдущую, чтобы модели не копились в памяти
+        model_key = (transcribe_func, repr(sorted(kwargs.items())))
+        if self._last_model is not None and self._last_model != model_key:
+            _clear_model_cache(self._last_model[0])
+        self._last_model = model_key
+        
         # Запоминаем начальное состояние памяти
         process = psutil.Process(os.getpid())
         mem_before = process.memory_info().rss / 1024 / 1024  # MB
@@ -67,37 +205,53 @@ class ASRBenchmark:
         print(f"Бенчмарк: {model_name}")
         print(f"{'='*60}")
         
-        # Запускаем транскрипцию
-        start_cpu = time.time()
-        cpu_percent_start = psutil.cpu_percent(interval=None)
-        
-        result = transcribe_func(self.audio_path, **kwargs)
+        # Прогрев на первых секундах аудио: холодная загрузка модели происходит здесь
+        warmup_result = None
+        if warmup:
+            if isinstance(self.audio_path, list):
+                warmup_path = self.audio_path[:1]
+                warmup_audio = [self._audio[0][:self.WARMUP_SAMPLES]]
+            else:
+                warmup_path = self.audio_path
+                warmup_audio = self._audio[:self.WARMUP_SAMPLES]
+            warmup_result = transcribe_func(warmup_path, audio=warmup_audio, **kwargs)
         
-        cpu_percent_end = psutil.cpu_percent(interval=None)
+        # Запускаем транскрипцию, загрузка CPU снимается каждые 100 мс в фоновом потоке
+        with _ResourceSampler(process) as sampler:
+            result = transcribe_func(self.audio_path, audio=self._audio, **kwargs)
         
         # Замеряем память после
         mem_after = process.memory_info().rss / 1024 / 1024  # MB
         memory_used = mem_after - mem_before
         
+        # При прогреве модель уже в кэше, поэтому время загрузки берем из прогрева
+        load_time = warmup_result["load_time"] if warmup_result else result["load_time"]
+        
         # Вычисляем метрики точности, если есть эталонный текст
         wer, cer = None, None
         if self.reference_text:
-            wer = self.calculate_wer(self.reference_text, result["text"])
-            cer = self.calculate_cer(self.reference_text, result["text"])
+            wer, cer = self.calculate_accuracy(result["text"])
             print(f"\n📊 Метрики точности:")
             print(f"   WER (Word Error Rate): {wer:.2%}")
             print(f"   CER (Character Error Rate): {cer:.2%}")
         
         benchmark_result = BenchmarkResult(
             model_name=model_name,
-            load_time=result["load_time"],
+            load_time=load_time,
             transcribe_time=result["transcribe_time"],
-            total_time=result["total_time"],
+            total_time=load_time + result["transcribe_time"],
+            steady_state_time=result["transcribe_time"],
+            cold_start_time=load_time + result["transcribe_time"],
             memory_used_mb=memory_used,
-            cpu_percent=(cpu_percent_start + cpu_percent_end) / 2,
+            cpu_percent=sampler.cpu_mean,
             transcription=result["text"],
             wer=wer,
-            cer=cer
+            cer=cer,
+            compute_type=result.get("compute_type"),
+            cpu_percent_peak=sampler.cpu_peak,
+            # Отсчет от RSS до прогрева: не учитывает модели и данные, загруженные ранее
+            peak_rss_mb=sampler.rss_peak - mem_before,
+            peak_rss_abs_mb=sampler.rss_peak
         )
         
         self.results.append(benchmark_result)
@@ -105,21 +259,84 @@ class ASRBenchmark:
         print(f"\n⏱️  Производительность:")
         print(f"   Загрузка модели: {benchmark_result.load_time:.2f} сек")
         print(f"   Транскрипция: {benchmark_result.transcribe_time:.2f} сек")
-        print(f"   Общее время: {benchmark_result.total_time:.2f} сек")
-        print(f"   Использовано памяти: {benchmark_result.memory_used_mb:.1f} MB")
-        print(f"   Загрузка CPU: {benchmark_result.cpu_percent:.1f}%")
+        print(f"   Холодный старт: {benchmark_result.cold_start_time:.2f} сек")
+        print(f"   Использовано памяти: {benchmark_result.memory_used_mb:.1f} MB (пик RSS: +{benchmark_result.peak_rss_mb:.1f} MB, всего {benchmark_result.peak_rss_abs_mb:.1f} MB)")
+        print(f"   Загрузка CPU: {benchmark_result.cpu_percent:.1f}% (пик: {benchmark_result.cpu_percent_peak:.1f}%)")
+        if "speech_duration" in result:
+            saved = result["audio_duration"] - result["speech_duration"]
+            print(f"   Отброшено VAD: {saved:.1f} сек из {result['audio_duration']:.1f} сек аудио")
         
         return benchmark_result
     
+    def benchmark_threads(
+        self,
+        transcribe_func: Callable,
+        model_name: str,
+        thread_counts: Optional[List[int]] = None,
+        **kwargs
+    ) -> BenchmarkResult:
+        """
+        Перебор количества потоков CPU и выбор самого быстрого варианта
+        
+        Args:
+            transcribe_func: функция транскрипции с параметром cpu_threads
+            model_name: название модели для отображения
+            thread_counts: варианты количества потоков (по умолчанию 4, 8 и число физических ядер)
+            **kwargs: дополнительные параметры для функции
+        
+        Returns:
+            BenchmarkResult самого быстрого варианта
+        """
+        if thread_counts is None:
+            thread_counts = sorted({4, 8, PHYSICAL_CORES})
+        
+        sweep = [
+            self.benchmark_function(
+                transcribe_func,
+                model_name=f"{model_name} [{threads} потоков]",
+                cpu_threads=threads,
+                **kwargs
+            )
+            for threads in thread_counts
+        ]
+        fastest = min(sweep, key=lambda x: x.transcribe_time)
+        print(f"\n🧵 Лучшее число потоков: {fastest.model_name} ({fastest.transcribe_time:.2f} сек)")
+        return fastest
+    
+    def calculate_accuracy(self, hypothesis: str) -> tuple[float, float]:
+        """
+        Вычисление WER и CER относительно эталона бенчмарка.
+        Нормализуется только гипотеза, эталон подготовлен в __init__
+        """
+        hypothesis_norm = _normalize_text(hypothesis)
+        if Levenshtein is None:
+            return (
+                jiwer.wer(self._reference_norm, hypothesis_norm),
+                jiwer.cer(self._reference_norm, hypothesis_norm),
+            )
+        wer = Levenshtein.distance(self._reference_tokens, hypothesis_norm.split()) / len(self._reference_tokens)
+        cer = Levenshtein.distance(self._reference_norm, hypothesis_norm) / len(self._reference_norm)
+        return wer, cer
+    
     @staticmethod
     def calculate_wer(reference: str, hypothesis: str) -> float:
         """Вычисление Word Error Rate"""
-        return jiwer.wer(reference, hypothesis)
+        if Levenshtein is None:
+            return jiwer.wer(reference, hypothesis)
+        # rapidfuzz принимает последовательности хешируемых элементов - считаем по словам
+        ref_tokens = reference.split()
+        hyp_tokens = hypothesis.split()
+        return Levenshtein.distance(ref_tokens, hyp_tokens) / len(ref_tokens)
     
     @staticmethod
     def calculate_cer(reference: str, hypothesis: str) -> float:
         """Вычисление Character Error Rate"""
-        return jiwer.cer(reference, hypothesis)
+        if Levenshtein is None:
+            return jiwer.cer(reference, hypothesis)
+        # Как cer_default в jiwer: только обрезка пробелов по краям
+        reference = reference.strip()
+        hypothesis = hypothesis.strip()
+        return Levenshtein.distance(reference, hypothesis) / len(reference)
     
     def print_comparison(self):
         """Печать сравнительной таблицы результатов"""
@@ -133,15 +350,21 @@ class ASRBenchmark:
         
         for i, result in enumerate(self.results, 1):
             print(f"{i}. {result.model_name}")
-            print(f"   Время: {result.total_time:.2f}с (загрузка: {result.load_time:.2f}с, транскрипция: {result.transcribe_time:.2f}с)")
-            print(f"   Память: {result.memory_used_mb:.1f} MB")
+            print(f"   Время: {result.steady_state_time:.2f}с (холодный старт: {result.cold_start_time:.2f}с, загрузка: {result.load_time:.2f}с)")
+            print(f"   Память: {result.memory_used_mb:.1f} MB (пик RSS: +{result.peak_rss_mb:.1f} MB)")
+            if result.compute_type:
+                print(f"   Точность вычислений: {result.compute_type}")
             if result.wer is not None:
                 print(f"   Точность: WER={result.wer:.2%}, CER={result.cer:.2%}")
             print()
         
         # Определяем победителей
-        fastest = min(self.results, key=lambda x: x.total_time)
-        print(f"🏆 Самый быстрый: {fastest.model_name} ({fastest.total_time:.2f} сек)")
+        fastest = min(self.results, key=lambda x: x.steady_state_time)
+        fastest_precision = f", {fastest.compute_type}" if fastest.compute_type else ""
+        print(f"🏆 Самый быстрый: {fastest.model_name} ({fastest.steady_state_time:.2f} сек{fastest_precision})")
+        
+        fastest_cold = min(self.results, key=lambda x: x.cold_start_time)
+        print(f"🚀 Быстрейший холодный старт: {fastest_cold.model_name} ({fastest_cold.cold_start_time:.2f} сек)")
         
         if self.results[0].wer is not None:
             most_accurate = min(self.results, key=lambda x: x.wer)
@@ -167,10 +390,10 @@ if __name__ == "__main__":
     # Тестируем Faster-Whisper
     benchmark.benchmark_function(
         transcribe_with_faster_whisper,
-        model_name="Faster-Whisper (base, int8, CPU)",
+        model_name="Faster-Whisper (base, auto, CPU)",
         model_size="base",
         device="cpu",
-        compute_type="int8"
+        compute_type="auto"
     )
     
     # Тестируем оригинальный Whisper
@@ -178,7 +401,8 @@ if __name__ == "__main__":
         transcribe_with_whisper,
         model_name="Whisper OpenAI (base, CPU)",
         model_size="base",
-        device="cpu"
+        device="cpu",
+        use_ct2=False  # оригинальный PyTorch FP32 для сравнения с CTranslate2
     )
     
     # Выводим сравнение
@@ -4,6 +4,8 @@ import shutil
 from typing import Optional
 from yt_dlp import YoutubeDL
 
+__all__ = ["download_audio", "FFmpegNotFoundError"]
+
 class FFmpegNotFoundError(RuntimeError):
     pass
 
@@ -12,6 +14,8 @@ def download_audio(
     out_dir: str = "downloads",
     ext: str = "mp3",
     bitrate_kbps: int = 192,
+    transcode: bool = False,
+    fixed_name: bool = True,
 ) -> Optional[pathlib.Path]:
     """
     Скачивает аудио из видео по URL с YouTube (или поддерживаемого сайта),
@@ -22,12 +26,17 @@ def download_audio(
       - out_dir: папка для сохранения.
       - ext: целевой формат аудио: 'mp3' или 'm4a' и т.п.
       - bitrate_kbps: целевой битрейт для mp3 (игнорируется для некоторых контейнеров).
+      - transcode: перекодировать дорожку в ext через ffmpeg. По умолчанию False:
+        сохраняется исходный поток (m4a/webm) без перекодирования, Whisper все равно
+        декодирует его в 16 кГц PCM при загрузке (ext в этом случае игнорируется).
+      - fixed_name: сохранять под фиксированным именем output.<ext> (по умолчанию).
+        False - имя по шаблону "<название> [<id>].<ext>".
     
     Возвращает:
       - pathlib.Path к сохраненному файлу или None в случае неудачи.
     """
     # Проверим наличие ffmpeg заранее, чтобы дать понятную ошибку
-    if shutil.which("ffmpeg") is None:
+    if transcode and shutil.which("ffmpeg") is None:
         raise FFmpegNotFoundError(
             "ffmpeg не найден в PATH. Установите ffmpeg и повторите попытку."
         )
@@ -37,14 +46,16 @@ def download_audio(
     # Настройки yt-dlp:
     # - bestaudio выбирает лучший аудиопоток
     # - постпроцессоры: извлечь аудио и перекодировать при необходимости
-    postprocessors = [{"key": "FFmpegExtractAudio", "preferredcodec": ext}]
-    # Для MP3 можно указать битрейт
-    if ext.lower() == "mp3":
-        postprocessors[0]["preferredquality"] = str(bitrate_kbps)
+    postprocessors = []
+    if transcode:
+        postprocessors.append({"key": "FFmpegExtractAudio", "preferredcodec": ext})
+        # Для MP3 можно указать битрейт
+        if ext.lower() == "mp3":
+            postprocessors[0]["preferredquality"] = str(bitrate_kbps)
 
     ydl_opts = {
-        "format": "bestaudio/best",
-        "outtmpl": os.path.join(out_dir, "output.%(ext)s"),  # Always use "output" as the filename
+        "format": "bestaudio/best" if transcode else "bestaudio[ext=m4a]/bestaudio",
+        "outtmpl": os.path.join(out_dir, "output.%(ext)s" if fixed_name else "%(title)s [%(id)s].%(ext)s"),
         "quiet": True,          # без лишнего шума в консоли
         "noprogress": True,
         "postprocessors": postprocessors,
@@ -58,24 +69,31 @@ def download_audio(
     try:
         with YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
-            # Since we're using a fixed filename, we can directly construct the final path
-            final_path = pathlib.Path(out_dir) / f"output.{ext}"
+            # Без перекодирования расширение определяется скачанным потоком
+            if not transcode:
+                ext = info.get("ext", ext)
+            # Итоговый путь: фиксированное имя или имя по шаблону yt-dlp
+            if fixed_name:
+                final_path = pathlib.Path(out_dir) / f"output.{ext}"
+            else:
+                final_path = pathlib.Path(ydl.prepare_filename(info)).with_suffix(f".{ext}")
             
             # Check if the file exists
             if final_path.exists():
                 return final_path.resolve()
             
             # If not found, try to find the most recently modified file with the correct extension
-            candidates = sorted(
-                pathlib.Path(out_dir).glob(f"*.{ext}"),
-                key=lambda p: p.stat().st_mtime,
-                reverse=True,
+            # Single pass over the directory; DirEntry.stat() is cached
+            best = max(
+                (e for e in os.scandir(out_dir) if e.is_file() and e.name.endswith(f".{ext}")),
+                key=lambda e: e.stat().st_mtime,
+                default=None,
             )
             
-            if candidates:
+            if best is not None:
                 # Rename the file to "output.{ext}" if it's not already named that way
-                file_path = candidates[0]
-                if file_path.name != f"output.{ext}":
+                file_path = pathlib.Path(best.path)
+                if fixed_name and file_path.name != f"output.{ext}":
                     new_path = file_path.parent / f"output.{ext}"
                     file_path.rename(new_path)
                     return new_path.resolve()
@@ -89,5 +107,6 @@ def download_audio(
 if __name__ == "__main__":
     test_url = "https://www.youtube.com/watch?v=LqV6T_X_QLc"
     directory = "downloads/"
-    path = download_audio(test_url, out_dir=directory, ext="mp3")
+    # transcode=True - примеры транскрибации читают downloads/output.mp3
+    path = download_audio(test_url, out_dir=directory, ext="mp3", transcode=True)
     print("Сохранено в:", path)
\ No newline at end of file
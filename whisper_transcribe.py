@@ -1,23 +1,125 @@
 import whisper
 import time
+from collections import OrderedDict
 from pathlib import Path
+from typing import Optional
+import numpy as np
 import torch
+from faster_whisper_transcribe import clear_model_cache as clear_ct2_model_cache
+from faster_whisper_transcribe import load_model as load_ct2_model
+
+
+# LRU кэш загруженных PyTorch моделей: (backend, model_size, compute_type, device) -> модель
+MODEL_CACHE_SIZE = 1
+_MODEL_CACHE: "OrderedDict[tuple, whisper.Whisper]" = OrderedDict()
+
+
+def clear_model_cache():
+    """Выгрузка всех закэшированных моделей (PyTorch и CTranslate2)"""
+    _MODEL_CACHE.clear()
+    clear_ct2_model_cache()
+
+
+def load_model(model_identifier: str = "base", device: str = "cpu") -> whisper.Whisper:
+    """
+    Загрузка PyTorch модели Whisper с кэшированием между вызовами
+    
+    Args:
+        model_identifier: размер модели или путь к файлу модели (.pt)
+        device: "cpu" или "cuda"
+    
+    Returns:
+        whisper.Whisper (повторные вызовы с теми же параметрами возвращают тот же объект)
+    """
+    key = ("whisper", model_identifier, "float32", device)
+    if key in _MODEL_CACHE:
+        _MODEL_CACHE.move_to_end(key)
+        return _MODEL_CACHE[key]
+    
+    while _MODEL_CACHE and len(_MODEL_CACHE) >= MODEL_CACHE_SIZE:
+        _MODEL_CACHE.popitem(last=False)
+    _MODEL_CACHE[key] = whisper.load_model(model_identifier, device=device)
+    return _MODEL_CACHE[key]
+
+
+def _transcribe_with_ct2(
+    audio_path: str,
+    model_size: str,
+    device: str = "cpu",
+    audio: Optional[np.ndarray] = None
+) -> dict:
+    """
+    Транскрибация через CTranslate2 (int8) с тем же форматом результата,
+    что и у оригинального Whisper. Модель загружается загрузчиком Faster-Whisper
+    (готовые CT2 веса, без конвертации)
+    """
+    # На GPU int8 выполняется как int8_float16 (см. transcribe_with_faster_whisper)
+    compute_type = "int8_float16" if device == "cuda" else "int8"
+    
+    print(f"[Whisper] Загрузка модели '{model_size}' (CTranslate2, {compute_type}) на {device}...")
+    start_load = time.time()
+
+    model = load_ct2_model(model_size, device=device, compute_type=compute_type)
+
+    load_time = time.time() - start_load
+    selected_compute_type = getattr(model.model, "compute_type", compute_type)
+    print(f"[Whisper] Модель загружена за {load_time:.2f} сек (compute_type: {selected_compute_type})")
+
+    print(f"[Whisper] Начинаем транскрипцию: {audio_path}")
+    start_transcribe = time.time()
+
+    # beam_size=1 - жадное декодирование, как в whisper.transcribe по умолчанию
+    segments, info = model.transcribe(
+        audio if audio is not None else audio_path,
+        language="ru",
+        task="transcribe",
+        beam_size=1,
+        word_timestamps=False
+    )
+
+    segments_list = [
+        {"start": segment.start, "end": segment.end, "text": segment.text}
+        for segment in segments
+    ]
+    text = "".join(segment["text"] for segment in segments_list)
+
+    transcribe_time = time.time() - start_transcribe
+
+    print(f"[Whisper] Транскрипция завершена за {transcribe_time:.2f} сек")
+    print(f"[Whisper] Обнаружен язык: {info.language}")
+
+    return {
+        "text": text.strip(),
+        "segments": segments_list,
+        "load_time": load_time,
+        "transcribe_time": transcribe_time,
+        "total_time": load_time + transcribe_time,
+        "language": info.language,
+        "compute_type": selected_compute_type
+    }
 
 
 def transcribe_with_whisper(
     audio_path: str,
     model_size: str = "base",
     model_path: str = None,  # Добавляем параметр для пути к модели
-    device: str = None
+    device: str = None,
+    use_ct2: bool = None,
+    audio: Optional[np.ndarray] = None
 ) -> dict:
     """
-    Транскрибация аудио с помощью оригинального Whisper
+    Транскрибация аудио моделью Whisper: на CPU по умолчанию через CTranslate2 (int8),
+    иначе оригинальной PyTorch реализацией
     
     Args:
         audio_path: путь к аудиофайлу
         model_size: размер модели (tiny, base, small, medium, large)
         model_path: путь к файлу модели (.pt). Если указан, игнорирует model_size
         device: None (автовыбор), "cpu" или "cuda"
+        use_ct2: использовать CTranslate2 (int8) вместо PyTorch.
+            None - включено на CPU. False - оригинальный PyTorch путь (для A/B сравнения)
+        audio: заранее декодированное аудио (mono float32, 16 кГц). Если указано,
+            файл audio_path повторно не декодируется
     
     Returns:
         dict с результатами транскрипции и метриками
@@ -27,13 +129,19 @@ def transcribe_with_whisper(
     if device is None:
         device = "cuda" if torch.cuda.is_available() else "cpu"
     
+    # На CPU используем int8 модель CTranslate2 (локальный .pt для нее не подходит)
+    if use_ct2 is None:
+        use_ct2 = device == "cpu"
+    if use_ct2 and not model_path:
+        return _transcribe_with_ct2(audio_path, model_size, device=device, audio=audio)
+    
     # Определяем, что использовать: путь к модели или размер
     model_identifier = model_path if model_path else model_size
     
     print(f"[Whisper] Загрузка модели '{model_identifier}' на {device}...")
     start_load = time.time()
     
-    model = whisper.load_model(model_identifier, device=device)
+    model = load_model(model_identifier, device=device)
     
     load_time = time.time() - start_load
     print(f"[Whisper] Модель загружена за {load_time:.2f} сек")
@@ -41,12 +149,18 @@ def transcribe_with_whisper(
     print(f"[Whisper] Начинаем транскрипцию: {audio_path}")
     start_transcribe = time.time()
     
+    # FP16 только на GPU: whisper.transcribe на CPU все равно принудительно переключается на FP32,
+    # а FP16 softmax в PyTorch на CPU медленнее FP32
+    fp16 = device == "cuda"
+    
     # Транскрибация с настройками для русского языка
     result = model.transcribe(
-        audio_path,
-        language="ru",
+        audio if audio is not None else audio_path,
+        language="ru",  # язык задан явно - шаг автоопределения пропускается
+        task="transcribe",
+        without_timestamps=True,  # токены временных меток не декодируются (бенчмарк их не использует)
         verbose=False,
-        fp16=False  # fp16=False для CPU (на GPU можно True)
+        fp16=fp16
     )
     
     transcribe_time = time.time() - start_transcribe
@@ -60,13 +174,15 @@ def transcribe_with_whisper(
         "load_time": load_time,
         "transcribe_time": transcribe_time,
         "total_time": load_time + transcribe_time,
-        "language": result["language"]
+        "language": result["language"],
+        "compute_type": "float16" if fp16 else "float32"
     }
 
 
 if __name__ == "__main__":
     # Пример использования
-    audio_file = "downloads/output.mp3"  # Замените на ваш файл
+    # Файл из uploading_video.py (скачан с transcode=True). Замените на ваш файл
+    audio_file = "downloads/output.mp3"
     
     # Вариант 1: Использование предустановленной модели по имени
     result = transcribe_with_whisper(